@@ -0,0 +1,160 @@
+import heapq
+import itertools
+import logging
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+
+# Hilos por defecto de AnyIO para ejecutar endpoints síncronos de FastAPI. Cada
+# petición en cola ocupa uno mientras espera, así que la cola debe caber en el pool.
+THREAD_POOL_LIMIT = 40
+# Hilos que se dejan libres para el resto de endpoints (métricas, búsquedas) y tareas en segundo plano
+THREAD_POOL_RESERVE = 8
+
+
+def cap_queue_to_thread_pool(max_concurrency: int, max_queue: int,
+                             thread_limit: int = THREAD_POOL_LIMIT, reserve: int = THREAD_POOL_RESERVE) -> int:
+    """
+    Limita 'max_queue' para que las peticiones en ejecución y en espera no agoten el
+    pool de hilos: si lo hicieran, el resto de endpoints se bloquearía en lugar de
+    recibir un 429 inmediato.
+    """
+    available = thread_limit - reserve - max_concurrency
+    if available < 0:
+        raise ValueError(
+            f"CHAT_MAX_CONCURRENCY={max_concurrency} no cabe en el pool de {thread_limit} hilos "
+            f"(se reservan {reserve})."
+        )
+    if max_queue > available:
+        logger.warning("CHAT_MAX_QUEUE=%d excede el pool de hilos; se limita a %d.", max_queue, available)
+        return available
+    return max_queue
+
+
+class AdmissionRejected(Exception):
+    """
+    Se lanza cuando una petición no puede ser admitida: la cola está llena (429)
+    o se agotó el plazo de espera en la cola (503). 'retry_after' indica en
+    segundos cuándo conviene reintentar.
+    """
+
+    def __init__(self, status_code: int, retry_after: int, reason: str):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class AdmissionController:
+    """
+    Limita el número de llamadas concurrentes a un recurso costoso (el modelo de
+    lenguaje) con un semáforo acotado y una cola de espera con prioridades y plazo.
+    Un número de prioridad menor se atiende antes; a igual prioridad, por orden de llegada.
+    """
+
+    def __init__(self, max_concurrency: int = 4, max_queue: int = 16, timeout: float = 10.0,
+                 window: int = 1000):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._wait_times = deque(maxlen=window)
+        self._service_times = deque(maxlen=window)
+        self._counters = {
+            "admitted": 0,
+            "rejected_queue_full": 0,
+            "rejected_timeout": 0,
+            "degraded": 0
+        }
+
+    def _retry_after(self) -> int:
+        service = (sum(self._service_times) / len(self._service_times)) if self._service_times else 1.0
+        return max(1, math.ceil(service * (len(self._waiting) + 1) / self.max_concurrency))
+
+    def acquire(self, priority: int = 1, timeout: Optional[float] = None) -> float:
+        """
+        Reserva un hueco de ejecución, esperando en cola si es necesario.
+        Retorna el tiempo de espera en segundos o lanza AdmissionRejected.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        with self._cond:
+            if self._active < self.max_concurrency and not self._waiting:
+                self._active += 1
+                return self._admit(start)
+
+            if len(self._waiting) >= self.max_queue:
+                self._counters["rejected_queue_full"] += 1
+                raise AdmissionRejected(429, self._retry_after(), "La cola de peticiones está llena.")
+
+            # [prioridad, orden de llegada, concedido]
+            entry = [priority, next(self._sequence), False]
+            heapq.heappush(self._waiting, entry)
+            deadline = start + timeout
+            while not entry[2]:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                    self._counters["rejected_timeout"] += 1
+                    raise AdmissionRejected(503, self._retry_after(), "Se agotó el tiempo de espera en la cola.")
+                self._cond.wait(remaining)
+            return self._admit(start)
+
+    def _admit(self, start: float) -> float:
+        waited = time.monotonic() - start
+        self._wait_times.append(waited)
+        self._counters["admitted"] += 1
+        return waited
+
+    def release(self, service_time: Optional[float] = None) -> None:
+        """
+        Libera el hueco y se lo cede directamente a la siguiente petición en cola.
+        """
+        with self._cond:
+            if service_time is not None:
+                self._service_times.append(service_time)
+            if self._waiting:
+                entry = heapq.heappop(self._waiting)
+                entry[2] = True
+                self._cond.notify_all()
+            else:
+                self._active -= 1
+
+    @contextmanager
+    def slot(self, priority: int = 1, timeout: Optional[float] = None):
+        self.acquire(priority, timeout)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    def record_degraded(self) -> None:
+        with self._cond:
+            self._counters["degraded"] += 1
+
+    def metrics(self) -> Dict:
+        with self._cond:
+            waits = sorted(self._wait_times)
+            return {
+                "active": self._active,
+                "queue_depth": len(self._waiting),
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                **self._counters,
+                "wait_time_avg": (sum(waits) / len(waits)) if waits else 0.0,
+                "wait_time_p95": waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0,
+                "wait_time_max": waits[-1] if waits else 0.0
+            }
@@ -1,10 +1,15 @@
 import os
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Query
 from neo4j import GraphDatabase
 import numpy as np
 from openai import OpenAI, DefaultHttpxClient
 from contextlib import asynccontextmanager
+from typing import Optional
+from admission import AdmissionController, AdmissionRejected, cap_queue_to_thread_pool
+from conversation import ConversationStore
+from bulk_export import ChunkIndex, load_artifact
+from neighbourhood import arrange_neighbourhood
 
 os.environ["SSL_CERT_FILE"] = ""
 
@@ -20,6 +25,22 @@ if not NEO4J_PASSWORD or not OPENAI_API_KEY:
 
 driver = GraphDatabase.driver(NEO4J_URI, auth=(neo4j_user, NEO4J_PASSWORD))
 
+# Si se define RETRIEVAL_ARTIFACT, /chat recupera desde un índice en memoria construido
+# a partir del artefacto de bulk_export en lugar de leer todos los chunks de Neo4j.
+RETRIEVAL_ARTIFACT = os.environ.get("RETRIEVAL_ARTIFACT")
+retrieval_index = ChunkIndex(load_artifact(RETRIEVAL_ARTIFACT)) if RETRIEVAL_ARTIFACT else None
+
+CHAT_MAX_CONCURRENCY = int(os.environ.get("CHAT_MAX_CONCURRENCY", "4"))
+admission = AdmissionController(
+    max_concurrency=CHAT_MAX_CONCURRENCY,
+    max_queue=cap_queue_to_thread_pool(CHAT_MAX_CONCURRENCY, int(os.environ.get("CHAT_MAX_QUEUE", "16"))),
+    timeout=float(os.environ.get("CHAT_QUEUE_TIMEOUT", "10"))
+)
+# Prioridades asignadas en el servidor (menor se atiende antes): las preguntas
+# interactivas de /chat van por delante de los resúmenes internos de conversación
+CHAT_PRIORITY = 1
+SUMMARY_PRIORITY = 9
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     yield
@@ -48,7 +69,9 @@ def get_chunks(limit: int = Query(10, ge=1, description="Número máximo de nodo
 def search_chunks(file: str = Query(..., description="Fragmento del nombre del archivo a buscar")):
     with driver.session() as session:
         result = session.run(
-            "MATCH (c:Chunk) WHERE c.file CONTAINS $file RETURN c LIMIT 10",
+            "MATCH (c:Chunk) "
+            "WHERE c.file CONTAINS $file OR any(f IN coalesce(c.source_files, []) WHERE f CONTAINS $file) "
+            "RETURN c LIMIT 10",
             file=file
         )
         chunks = [record["c"] for record in result]
@@ -75,6 +98,26 @@ def get_embedding_for_text(text: str, model: str = "text-embedding-ada-002") ->
     embedding = response.data[0].embedding
     return embedding
 
+def summarize_conversation(summary: str, turns: list, max_tokens: int) -> str:
+    transcript = "\n".join(f"Usuario: {turn['question']}\nAsistente: {turn['answer']}" for turn in turns)
+    with admission.slot(priority=SUMMARY_PRIORITY, timeout=1.0):
+        response = openai_client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=[
+                {"role": "system", "content": "Resume de forma breve la conversación, conservando los datos necesarios para responder preguntas de seguimiento."},
+                {"role": "user", "content": f"Resumen previo: {summary}\n\nNuevos turnos:\n{transcript}"}
+            ],
+            max_tokens=max_tokens,
+            temperature=0
+        )
+    return response.choices[0].message.content
+
+conversations = ConversationStore(
+    max_turns=int(os.environ.get("CHAT_HISTORY_TURNS", "4")),
+    summary_tokens=int(os.environ.get("CHAT_SUMMARY_TOKENS", "300")),
+    summarizer=summarize_conversation
+)
+
 def is_off_topic(query: str, package: str) -> bool:
     keywords = {
         "faucet": ["faucet", "shiny", "plumber", "deploy", "documentation"],
@@ -107,11 +150,68 @@ def search_chunks_by_text(
     
     return {"query": q, "results": [{"score": score, "chunk": chunk} for score, chunk in top_chunks]}
 
+MAX_NEIGHBOUR_HOPS = 5
+# Límites del contexto expandido, para no exceder la ventana del modelo junto al historial
+MAX_CONTEXT_CHUNKS = int(os.environ.get("CHAT_MAX_CONTEXT_CHUNKS", "15"))
+MAX_CONTEXT_TOKENS = int(os.environ.get("CHAT_MAX_CONTEXT_TOKENS", "3000"))
+
+def expand_with_neighbours(seeds: list, hops: int, decay: float) -> list:
+    """
+    Expande los chunks semilla con hasta 'hops' predecesores y sucesores siguiendo
+    las relaciones NEXT del archivo de la semilla (las relaciones sin 'file', creadas
+    sin deduplicación, siempre unen chunks del mismo archivo), en una única consulta
+    a Neo4j. Cada vecino se retorna una sola vez, a su distancia mínima, y recibe la
+    puntuación de su semilla multiplicada por decay^distancia. El resultado se limita
+    y ordena con neighbourhood.arrange_neighbourhood.
+    """
+    query = f"""
+    UNWIND $seeds AS seed
+    MATCH (s:Chunk) WHERE elementId(s) = seed.id
+    CALL {{
+        WITH s
+        OPTIONAL MATCH after = (s)-[rels:NEXT*1..{hops}]->(n:Chunk)
+        WHERE all(r IN rels WHERE coalesce(r.file, s.file) = s.file)
+        WITH n, min(length(after)) AS distance
+        RETURN collect({{node: n, distance: distance}}) AS following
+    }}
+    CALL {{
+        WITH s
+        OPTIONAL MATCH before = (m:Chunk)-[rels:NEXT*1..{hops}]->(s)
+        WHERE all(r IN rels WHERE coalesce(r.file, s.file) = s.file)
+        WITH m, min(length(before)) AS distance
+        RETURN collect({{node: m, distance: distance}}) AS preceding
+    }}
+    RETURN seed.rank AS rank, seed.score AS score, following, preceding
+    """
+    neighbours = []
+    with driver.session() as session:
+        result = session.run(
+            query,
+            seeds=[{"id": element_id, "score": score, "rank": rank} for rank, (score, _, element_id) in enumerate(seeds)]
+        )
+        for record in result:
+            for direction, key in ((1, "following"), (-1, "preceding")):
+                for neighbour in record[key]:
+                    node = neighbour["node"]
+                    if node is None:
+                        continue
+                    neighbours.append((
+                        record["rank"], direction * neighbour["distance"],
+                        record["score"] * decay ** neighbour["distance"], dict(node), node.element_id
+                    ))
+
+    return arrange_neighbourhood(seeds, neighbours, MAX_CONTEXT_CHUNKS, MAX_CONTEXT_TOKENS)
+
 @app.post("/chat", summary="Responder preguntas utilizando RAG (filtrado por dominio)")
 def chat(
+    background_tasks: BackgroundTasks,
     q: str = Query(..., description="Pregunta a realizar"),
     package: str = Query(..., description="Nombre del paquete (por ejemplo, faucet, taplock, etc.)"),
-    limit: int = Query(5, ge=1, description="Número máximo de documentos a usar como contexto")
+    limit: int = Query(5, ge=1, description="Número máximo de documentos a usar como contexto"),
+    expand: int = Query(0, ge=0, le=MAX_NEIGHBOUR_HOPS, description="Número de chunks anteriores y siguientes (relación NEXT) a añadir por cada chunk recuperado"),
+    decay: float = Query(0.8, gt=0, le=1, description="Factor de decaimiento aplicado a la puntuación de los vecinos por cada salto"),
+    degrade: bool = Query(True, description="Bajo sobrecarga, devolver solo los chunks recuperados en lugar de rechazar la petición"),
+    session_id: Optional[str] = Query(None, description="Identificador de la conversación para mantener el historial entre preguntas")
 ):
     package_prompts = {
         "faucet": {
@@ -128,34 +228,44 @@ def chat(
     if pkg not in package_prompts:
         raise HTTPException(status_code=400, detail=f"El paquete '{package}' no está soportado.")
 
-    if is_off_topic(q, pkg):
+    conversation = conversations.get(session_id, pkg) if session_id else None
+    condensed = conversation.condensed_question(q) if conversation else q
+
+    if is_off_topic(condensed, pkg):
         return {
             "package": package,
             "query": q,
             "context": "",
-            "answer": f"Lo siento, solo respondo preguntas relacionadas con el paquete {package}."
+            "answer": f"Lo siento, solo respondo preguntas relacionadas con el paquete {package}.",
+            "session_id": session_id
         }
 
-    query_embedding = get_embedding_for_text(q)
+    if conversation:
+        query_embedding = conversation.condensed_embedding(q, get_embedding_for_text)
+    else:
+        query_embedding = get_embedding_for_text(q)
 
-    try:
-        with driver.session() as session:
-            result = session.run(
-                "MATCH (c:Chunk) WHERE toLower(c.package) = toLower($package) RETURN c",
-                package=package
-            )
-            chunks = [record["c"] for record in result]
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al recuperar los chunks de Neo4j: {e}")
+    if retrieval_index is not None:
+        scored_chunks = retrieval_index.search(query_embedding, pkg, limit)
+    else:
+        try:
+            with driver.session() as session:
+                result = session.run(
+                    "MATCH (c:Chunk) WHERE toLower(c.package) = toLower($package) RETURN c",
+                    package=package
+                )
+                chunks = [record["c"] for record in result]
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al recuperar los chunks de Neo4j: {e}")
 
-    scored_chunks = []
-    for chunk in chunks:
-        emb = chunk.get("embedding")
-        if emb is None:
-            continue
-        score = cosine_similarity(query_embedding, emb)
-        scored_chunks.append((score, dict(chunk)))
-    scored_chunks.sort(key=lambda x: x[0], reverse=True)
+        scored_chunks = []
+        for chunk in chunks:
+            emb = chunk.get("embedding")
+            if emb is None:
+                continue
+            score = cosine_similarity(query_embedding, emb)
+            scored_chunks.append((score, dict(chunk), chunk.element_id))
+        scored_chunks.sort(key=lambda x: x[0], reverse=True)
 
     threshold = 0.6
     if not scored_chunks or scored_chunks[0][0] < threshold:
@@ -163,11 +273,19 @@ def chat(
             "package": package,
             "query": q,
             "context": "",
-            "answer": f"Lo siento, solo respondo preguntas relacionadas con el paquete {package}."
+            "answer": f"Lo siento, solo respondo preguntas relacionadas con el paquete {package}.",
+            "session_id": session_id
         }
 
     top_chunks = scored_chunks[:limit]
-    context = "\n\n".join([chunk.get("text", "") for score, chunk in top_chunks])
+    if expand > 0 and retrieval_index is not None:
+        top_chunks = retrieval_index.expand(top_chunks, expand, decay, MAX_CONTEXT_CHUNKS, MAX_CONTEXT_TOKENS)
+    elif expand > 0:
+        try:
+            top_chunks = expand_with_neighbours(top_chunks, expand, decay)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al recuperar los chunks vecinos de Neo4j: {e}")
+    context = "\n\n".join([chunk.get("text", "") for score, chunk, _ in top_chunks])
     if not context.strip():
         context = "No se encontró información específica en la documentación para esta consulta."
 
@@ -179,22 +297,61 @@ def chat(
     )
 
     try:
-        response = openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": package_prompts[pkg]["system_message"]},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=500,
-            temperature=0.7
-        )
+        with admission.slot(priority=CHAT_PRIORITY):
+            response = openai_client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=[
+                    {"role": "system", "content": package_prompts[pkg]["system_message"]},
+                    *(conversation.history_messages() if conversation else []),
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=500,
+                temperature=0.7
+            )
         answer = response.choices[0].message.content
+    except AdmissionRejected as e:
+        if not degrade:
+            raise HTTPException(
+                status_code=e.status_code,
+                detail=f"Servicio sobrecargado: {e.reason}",
+                headers={"Retry-After": str(e.retry_after)}
+            )
+        admission.record_degraded()
+        return {
+            "package": package,
+            "query": q,
+            "context": context,
+            "answer": "El servicio está sobrecargado. Estos son los fragmentos de la documentación más relevantes para tu pregunta.",
+            "degraded": True,
+            "session_id": session_id,
+            "results": [
+                {"score": score, "chunk": {k: v for k, v in chunk.items() if k != "embedding"}}
+                for score, chunk, _ in top_chunks
+            ]
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al llamar a OpenAI: {e}")
 
+    if conversation:
+        evicted = conversations.record_turn(conversation, q, answer)
+        if evicted:
+            # El resumen se genera después de enviar la respuesta
+            background_tasks.add_task(conversations.compact, conversation, evicted)
+
     return {
         "package": package,
         "query": q,
         "context": context,
-        "answer": answer
+        "answer": answer,
+        "session_id": session_id
     }
+
+@app.delete("/chat/sessions/{session_id}", summary="Borrar el historial de una conversación")
+def delete_chat_session(session_id: str):
+    if not conversations.delete(session_id):
+        raise HTTPException(status_code=404, detail="No se encontró la conversación.")
+    return {"session_id": session_id, "deleted": True}
+
+@app.get("/metrics/admission", summary="Métricas del control de admisión de /chat")
+def admission_metrics():
+    return admission.metrics()
@@ -0,0 +1,344 @@
+import os
+import csv
+import json
+import argparse
+import logging
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from neighbourhood import arrange_neighbourhood
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+ARTIFACT_VERSION = 2
+
+# Columnas de texto: se guardan como bytes UTF-8 concatenados más offsets, para
+# que una fila muy larga no obligue a rellenar todas las demás a su longitud
+STRING_COLUMNS = ("package", "file_path", "text", "sources", "edge_file")
+
+
+def _pack_strings(values: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Codifica una lista de cadenas como un bloque de bytes UTF-8 (uint8) y un array
+    int64 de n+1 offsets: la cadena i ocupa data[offsets[i]:offsets[i + 1]].
+    """
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _unpack_strings(data: np.ndarray, offsets: np.ndarray) -> List[str]:
+    blob = data.tobytes()
+    bounds = offsets.tolist()
+    return [blob[bounds[i]:bounds[i + 1]].decode("utf-8") for i in range(len(bounds) - 1)]
+
+
+def export_artifact(chunks: list, embeddings: list, edges: list, path: str) -> str:
+    """
+    Escribe un artefacto columnar comprimido (.npz) con los metadatos de los chunks
+    (una columna por campo; las de texto como bytes UTF-8 más offsets), la matriz
+    de embeddings como bloque binario float32 y las relaciones NEXT como dos listas
+    de índices de fila más el archivo de cada relación. 'edges' sigue el formato
+    de dedup.build_next_edges. La carpeta no se guarda: se deriva del archivo al
+    cargar en Neo4j. Retorna la ruta del archivo generado.
+    """
+    if not chunks:
+        raise ValueError("No hay chunks para exportar.")
+    if len(chunks) != len(embeddings):
+        raise ValueError("El número de chunks y de embeddings no coincide.")
+
+    row_of = {(chunk["file"], chunk["chunk_id"]): idx for idx, chunk in enumerate(chunks)}
+    edge_from, edge_to, edge_file = [], [], []
+    for edge in edges:
+        start = row_of.get((edge["from_file"], edge["from_chunk_id"]))
+        end = row_of.get((edge["to_file"], edge["to_chunk_id"]))
+        if start is not None and end is not None:
+            edge_from.append(start)
+            edge_to.append(end)
+            edge_file.append(edge["file"])
+
+    sources = [
+        json.dumps(chunk.get("sources", [{"file": chunk["file"], "chunk_id": chunk["chunk_id"]}]), ensure_ascii=False)
+        for chunk in chunks
+    ]
+    strings = {
+        "package": [chunk["package"] for chunk in chunks],
+        "file_path": [chunk["file"] for chunk in chunks],
+        "text": [chunk["text"] for chunk in chunks],
+        "sources": sources,
+        "edge_file": edge_file
+    }
+    columns = {}
+    for name in STRING_COLUMNS:
+        columns[f"{name}_data"], columns[f"{name}_offsets"] = _pack_strings(strings[name])
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    np.savez_compressed(
+        path,
+        version=np.array(ARTIFACT_VERSION),
+        chunk_id=np.array([chunk["chunk_id"] for chunk in chunks], dtype=np.int32),
+        embeddings=np.asarray(embeddings, dtype=np.float32).reshape(len(chunks), -1),
+        edge_from=np.array(edge_from, dtype=np.int32),
+        edge_to=np.array(edge_to, dtype=np.int32),
+        **columns
+    )
+    if not path.endswith(".npz"):
+        path += ".npz"
+    logger.info("Artefacto exportado en %s: %d chunks, %d relaciones NEXT.", path, len(chunks), len(edge_from))
+    return path
+
+
+def load_artifact(path: str) -> Dict:
+    """
+    Carga un artefacto generado por export_artifact. Retorna un diccionario con
+    'chunks' (lista de diccionarios), 'embeddings' (matriz float32), 'edges'
+    (matriz Nx2 de índices de fila) y 'edge_files' (archivo de cada relación).
+    """
+    with np.load(path, allow_pickle=False) as data:
+        version = int(data["version"])
+        if version != ARTIFACT_VERSION:
+            raise ValueError(f"Versión de artefacto no soportada: {version}")
+        # Cada acceso data[columna] descomprime la columna completa: se lee una sola vez
+        strings = {name: _unpack_strings(data[f"{name}_data"], data[f"{name}_offsets"]) for name in STRING_COLUMNS}
+        chunk_id = data["chunk_id"].tolist()
+        embeddings = data["embeddings"]
+        edge_from = data["edge_from"]
+        edge_to = data["edge_to"]
+    package, file_path, text, sources = (strings[name] for name in ("package", "file_path", "text", "sources"))
+    chunks = [
+        {
+            "package": package[i],
+            "file": file_path[i],
+            "chunk_id": chunk_id[i],
+            "text": text[i],
+            "sources": json.loads(sources[i])
+        }
+        for i in range(len(chunk_id))
+    ]
+    edges = np.stack([edge_from, edge_to], axis=1) if len(edge_from) else np.empty((0, 2), dtype=np.int32)
+    logger.info("Artefacto cargado desde %s: %d chunks, %d relaciones NEXT.", path, len(chunks), len(edges))
+    return {"chunks": chunks, "embeddings": embeddings, "edges": edges, "edge_files": strings["edge_file"]}
+
+
+def write_neo4j_import_csvs(artifact: Dict, output_dir: str) -> Tuple[str, str]:
+    """
+    Genera los CSV de nodos y relaciones para 'neo4j-admin database import full'.
+    Los arrays (embedding, source_files, source_chunk_ids) usan ';' como separador.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    nodes_path = os.path.join(output_dir, "chunks.csv")
+    edges_path = os.path.join(output_dir, "next.csv")
+
+    with open(nodes_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow([
+            ":ID", "file", "chunk_id:int", "text", "embedding:float[]", "folder", "package",
+            "source_files:string[]", "source_chunk_ids:int[]", ":LABEL"
+        ])
+        for idx, chunk in enumerate(artifact["chunks"]):
+            writer.writerow([
+                idx,
+                chunk["file"],
+                chunk["chunk_id"],
+                chunk["text"],
+                ";".join(repr(float(x)) for x in artifact["embeddings"][idx]),
+                os.path.dirname(chunk["file"]),
+                chunk["package"],
+                ";".join(s["file"] for s in chunk["sources"]),
+                ";".join(str(s["chunk_id"]) for s in chunk["sources"]),
+                "Chunk"
+            ])
+
+    with open(edges_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow([":START_ID", ":END_ID", "file", ":TYPE"])
+        for (start, end), file in zip(artifact["edges"].tolist(), artifact["edge_files"]):
+            writer.writerow([start, end, file, "NEXT"])
+
+    logger.info(
+        "CSV generados. Importar con: neo4j-admin database import full --nodes=%s --relationships=%s "
+        "--array-delimiter=\";\" --multiline-fields=true neo4j",
+        nodes_path, edges_path
+    )
+    return nodes_path, edges_path
+
+
+def load_into_neo4j(artifact: Dict, driver, batch_size: int = 500) -> None:
+    """
+    Carga el artefacto en una base de datos Neo4j en línea mediante escrituras por
+    lotes (UNWIND), sin volver a calcular embeddings.
+    """
+    node_query = """
+    UNWIND $rows AS row
+    CREATE (c:Chunk {
+        file: row.file,
+        chunk_id: row.chunk_id,
+        text: row.text,
+        embedding: row.embedding,
+        folder: row.folder,
+        package: row.package,
+        source_files: row.source_files,
+        source_chunk_ids: row.source_chunk_ids
+    })
+    """
+    edge_query = """
+    UNWIND $edges AS edge
+    MATCH (a:Chunk {file: edge.from_file, chunk_id: edge.from_chunk_id})
+    MATCH (b:Chunk {file: edge.to_file, chunk_id: edge.to_chunk_id})
+    MERGE (a)-[:NEXT {file: edge.file}]->(b)
+    """
+    chunks = artifact["chunks"]
+    with driver.session() as session:
+        # Índice compuesto para que cada MATCH de las relaciones sea una búsqueda indexada
+        session.run("CREATE INDEX chunk_file_chunk_id IF NOT EXISTS FOR (c:Chunk) ON (c.file, c.chunk_id)").consume()
+        for start in range(0, len(chunks), batch_size):
+            rows = [
+                {
+                    "file": chunk["file"],
+                    "chunk_id": chunk["chunk_id"],
+                    "text": chunk["text"],
+                    "embedding": artifact["embeddings"][idx].tolist(),
+                    "folder": os.path.dirname(chunk["file"]),
+                    "package": chunk["package"],
+                    "source_files": [s["file"] for s in chunk["sources"]],
+                    "source_chunk_ids": [s["chunk_id"] for s in chunk["sources"]]
+                }
+                for idx, chunk in enumerate(chunks[start:start + batch_size], start=start)
+            ]
+            session.execute_write(lambda tx: tx.run(node_query, rows=rows).consume())
+            logger.info("Cargados %d/%d chunks en Neo4j.", min(start + batch_size, len(chunks)), len(chunks))
+
+        session.run("CALL db.awaitIndexes()").consume()
+        edges = [
+            {
+                "from_file": chunks[a]["file"], "from_chunk_id": chunks[a]["chunk_id"],
+                "to_file": chunks[b]["file"], "to_chunk_id": chunks[b]["chunk_id"],
+                "file": file
+            }
+            for (a, b), file in zip(artifact["edges"].tolist(), artifact["edge_files"])
+        ]
+        for start in range(0, len(edges), batch_size):
+            batch = edges[start:start + batch_size]
+            session.execute_write(lambda tx: tx.run(edge_query, edges=batch).consume())
+    logger.info("Relaciones NEXT cargadas en Neo4j: %d.", len(edges))
+
+
+class ChunkIndex:
+    """
+    Índice de recuperación en memoria construido a partir del artefacto: matriz de
+    embeddings normalizada para similitud de coseno y lista de adyacencia NEXT
+    (vecino, archivo de la relación).
+    """
+
+    def __init__(self, artifact: Dict):
+        self.chunks = artifact["chunks"]
+        embeddings = np.asarray(artifact["embeddings"], dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.embeddings = embeddings / norms
+        self.packages = np.array([chunk["package"].lower() for chunk in self.chunks])
+        self.successors: List[List[int]] = [[] for _ in self.chunks]
+        self.predecessors: List[List[int]] = [[] for _ in self.chunks]
+        for (start, end), file in zip(artifact["edges"].tolist(), artifact["edge_files"]):
+            self.successors[start].append((end, file))
+            self.predecessors[end].append((start, file))
+
+    def search(self, query_embedding: list, package: str, limit: int) -> list:
+        """
+        Retorna hasta 'limit' tuplas (score, chunk, fila) del paquete ordenadas por similitud.
+        """
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        rows = np.flatnonzero(self.packages == package.lower())
+        scores = self.embeddings[rows] @ (query / norm)
+        order = np.argsort(-scores)[:limit]
+        return [(float(scores[i]), dict(self.chunks[rows[i]]), int(rows[i])) for i in order]
+
+    def expand(self, seeds: list, hops: int, decay: float, max_chunks: int, max_tokens: int) -> list:
+        """
+        Equivalente en memoria de api.expand_with_neighbours: añade hasta 'hops'
+        predecesores y sucesores por semilla con puntuación score * decay^distancia,
+        siguiendo solo las relaciones NEXT del archivo de la semilla, y limita el resultado con neighbourhood.arrange_neighbourhood.
+        """
+        neighbours = []
+        for rank, (score, _, row) in enumerate(seeds):
+            file = self.chunks[row]["file"]
+            for adjacency, direction in ((self.successors, 1), (self.predecessors, -1)):
+                # La deduplicación puede crear ciclos en NEXT: cada nodo se visita una vez
+                visited = {row}
+                frontier = [row]
+                for distance in range(1, hops + 1):
+                    frontier = [n for node in frontier for n, f in adjacency[node] if f == file and n not in visited]
+                    visited.update(frontier)
+                    for neighbour in frontier:
+                        neighbours.append((
+                            rank, direction * distance, score * decay ** distance,
+                            dict(self.chunks[neighbour]), neighbour
+                        ))
+        return arrange_neighbourhood(seeds, neighbours, max_chunks, max_tokens)
+
+
+def build_artifact_from_sources(base_directory: str, path: str) -> str:
+    """
+    Ejecuta chunking, deduplicación y embeddings sobre la carpeta 'source' y
+    exporta el resultado como artefacto, sin escribir en Neo4j.
+    """
+    from chunking import process_all_files
+    from dedup import deduplicate_chunks, build_next_edges
+    from embedding import get_embedding_for_text
+
+    chunks_data = process_all_files(base_directory)
+    unique_chunks, _ = deduplicate_chunks(chunks_data)
+
+    embedded_chunks, embeddings = [], []
+    for chunk in unique_chunks:
+        logger.info("Generando embedding para %s - Chunk %s", chunk["file"], chunk["chunk_id"])
+        try:
+            embeddings.append(get_embedding_for_text(chunk["text"]))
+            embedded_chunks.append(chunk)
+        except Exception as e:
+            logger.error("Error procesando el chunk %s de %s: %s", chunk["chunk_id"], chunk["file"], e)
+
+    return export_artifact(embedded_chunks, embeddings, build_next_edges(embedded_chunks), path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exportación e importación masiva de chunks y embeddings.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Genera el artefacto a partir de la carpeta 'source'")
+    export_parser.add_argument("artifact")
+
+    csv_parser = subparsers.add_parser("csv", help="Genera los CSV para neo4j-admin database import")
+    csv_parser.add_argument("artifact")
+    csv_parser.add_argument("output_dir")
+
+    load_parser = subparsers.add_parser("load", help="Carga el artefacto en Neo4j")
+    load_parser.add_argument("artifact")
+
+    args = parser.parse_args()
+    script_directory = os.path.abspath(os.path.dirname(__file__))
+
+    if args.command == "export":
+        build_artifact_from_sources(script_directory, args.artifact)
+    elif args.command == "csv":
+        write_neo4j_import_csvs(load_artifact(args.artifact), os.path.abspath(args.output_dir))
+    elif args.command == "load":
+        from dotenv import load_dotenv
+        from neo4j import GraphDatabase
+
+        load_dotenv()
+        driver = GraphDatabase.driver(
+            os.environ.get("NEO4J_URI", "bolt://localhost:7687"),
+            auth=("neo4j", os.environ.get("NEO4J_PASSWORD"))
+        )
+        try:
+            load_into_neo4j(load_artifact(args.artifact), driver)
+        finally:
+            driver.close()
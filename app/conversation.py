@@ -0,0 +1,165 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from text_utils import estimate_tokens, truncate_to_tokens
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+
+class Conversation:
+    """
+    Estado de una conversación: los últimos turnos completos, un resumen acumulado
+    de los turnos más antiguos, los turnos desalojados pendientes de resumir y una
+    caché de embeddings de las preguntas.
+    """
+
+    def __init__(self, package: str, max_turns: int):
+        self.package = package
+        self.turns = deque()
+        self.max_turns = max_turns
+        self.summary = ""
+        self.pending: List[Dict] = []
+        self.embeddings: Dict[str, list] = {}
+        self.last_access = time.monotonic()
+        self.lock = threading.Lock()
+
+    def condensed_question(self, question: str) -> str:
+        """
+        Texto de la pregunta enriquecido con las preguntas recientes, útil para
+        interpretar preguntas de seguimiento que por sí solas carecen de contexto.
+        """
+        with self.lock:
+            previous = [turn["question"] for turn in self.turns]
+        return " ".join(previous + [question])
+
+    def condensed_embedding(self, question: str, embed: Callable[[str], list], history_weight: float = 0.5) -> list:
+        """
+        Embedding para la recuperación: el de la pregunta actual combinado con los
+        de las preguntas anteriores (reutilizados de la caché) con peso decreciente.
+        Solo se calcula un embedding nuevo por turno.
+        """
+        with self.lock:
+            current = self.embeddings.get(question)
+        if current is None:
+            # La llamada al proveedor se hace fuera del lock
+            current = embed(question)
+        with self.lock:
+            self.embeddings[question] = current
+            turns = list(self.turns)
+            embeddings = dict(self.embeddings)
+        combined = np.array(current, dtype=float)
+        weight = history_weight
+        for turn in reversed(turns):
+            cached = embeddings.get(turn["question"])
+            if cached is not None:
+                combined += weight * np.array(cached, dtype=float)
+                weight *= history_weight
+        return combined.tolist()
+
+    def history_messages(self) -> List[Dict]:
+        with self.lock:
+            summary = self.summary
+            # Los turnos pendientes de resumir se envían completos hasta que se compactan
+            turns = self.pending + list(self.turns)
+        messages = []
+        if summary:
+            messages.append({"role": "system", "content": f"Resumen de la conversación previa: {summary}"})
+        for turn in turns:
+            messages.append({"role": "user", "content": turn["question"]})
+            messages.append({"role": "assistant", "content": turn["answer"]})
+        return messages
+
+
+class ConversationStore:
+    """
+    Almacén en memoria de conversaciones con número de sesiones acotado (LRU) y
+    caducidad por inactividad. Cada conversación conserva como máximo 'max_turns'
+    turnos; al superarla se desaloja de una vez la mitad más antigua, que se
+    compacta en un resumen que nunca supera 'summary_tokens'. Así el resumen se
+    genera una vez cada varios turnos y el coste por turno es constante.
+    """
+
+    def __init__(self, max_turns: int = 4, summary_tokens: int = 300, max_sessions: int = 1000,
+                 ttl: float = 3600.0, summarizer: Optional[Callable[[str, List[Dict], int], str]] = None):
+        self.max_turns = max_turns
+        self.summary_tokens = summary_tokens
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.summarizer = summarizer
+        self._sessions: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str, package: str) -> Conversation:
+        """
+        Retorna la conversación de la sesión, creando una nueva si no existe,
+        ha caducado o cambió el paquete consultado.
+        """
+        now = time.monotonic()
+        with self._lock:
+            conversation = self._sessions.get(session_id)
+            if (conversation is None or conversation.package != package
+                    or now - conversation.last_access > self.ttl):
+                conversation = Conversation(package, self.max_turns)
+                self._sessions[session_id] = conversation
+            self._sessions.move_to_end(session_id)
+            conversation.last_access = now
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return conversation
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def record_turn(self, conversation: Conversation, question: str, answer: str) -> List[Dict]:
+        """
+        Añade el turno. Si la ventana se desborda, desaloja la mitad más antigua y
+        la deja pendiente de resumir. Retorna los turnos desalojados, que deben
+        pasarse a compact() (por ejemplo, en segundo plano tras responder).
+        """
+        with conversation.lock:
+            conversation.turns.append({"question": question, "answer": answer})
+            evicted = []
+            if len(conversation.turns) > conversation.max_turns:
+                keep = max(1, conversation.max_turns // 2)
+                while len(conversation.turns) > keep:
+                    evicted.append(conversation.turns.popleft())
+                conversation.pending.extend(evicted)
+            active = {turn["question"] for turn in conversation.turns}
+            conversation.embeddings = {q: e for q, e in conversation.embeddings.items() if q in active}
+        return evicted
+
+    def compact(self, conversation: Conversation, evicted: List[Dict]) -> None:
+        """
+        Resume los turnos desalojados en el resumen de la conversación. El resumen
+        se genera fuera del lock; si mientras tanto otra compactación actualizó el
+        resumen, los turnos se añaden de forma extractiva al resumen vigente.
+        """
+        with conversation.lock:
+            base_summary = conversation.summary
+        summary = self._compact(base_summary, evicted)
+        with conversation.lock:
+            if conversation.summary == base_summary:
+                conversation.summary = summary
+            else:
+                conversation.summary = self._extract(conversation.summary, evicted)
+            conversation.pending = [turn for turn in conversation.pending if not any(turn is e for e in evicted)]
+
+    def _compact(self, summary: str, turns: List[Dict]) -> str:
+        if self.summarizer is not None:
+            try:
+                return truncate_to_tokens(self.summarizer(summary, turns, self.summary_tokens), self.summary_tokens)
+            except Exception as e:
+                logger.warning("No se pudo resumir la conversación, se usa resumen extractivo: %s", e)
+        return self._extract(summary, turns)
+
+    def _extract(self, summary: str, turns: List[Dict]) -> str:
+        extract = " ".join(f"Usuario: {turn['question']} Asistente: {turn['answer']}" for turn in turns)
+        return truncate_to_tokens(f"{summary} {extract}".strip(), self.summary_tokens)
@@ -0,0 +1,191 @@
+import hashlib
+import logging
+import zlib
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normaliza espacios en blanco para que dos chunks que solo difieren en
+    indentación o saltos de línea produzcan el mismo hash exacto.
+    """
+    return " ".join(text.split())
+
+
+def exact_hash(text: str) -> str:
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def shingles(text: str, k: int = 5) -> set:
+    """
+    Genera el conjunto de k-gramas de palabras del texto, codificados como enteros de 32 bits.
+    Los textos con menos de 'k' palabras se representan con un único shingle.
+    """
+    words = normalize_text(text).lower().split()
+    if len(words) <= k:
+        grams = [" ".join(words)]
+    else:
+        grams = [" ".join(words[i:i + k]) for i in range(len(words) - k + 1)]
+    return {zlib.crc32(g.encode("utf-8")) & MAX_HASH for g in grams}
+
+
+class MinHasher:
+    """
+    Calcula firmas MinHash con 'num_perm' permutaciones aleatorias de la forma (a*x + b) mod p.
+    """
+
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.a = rng.randint(1, MAX_HASH, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, MAX_HASH, size=num_perm, dtype=np.uint64)
+
+    def signature(self, shingle_set: set) -> np.ndarray:
+        if not shingle_set:
+            return np.full(self.num_perm, MAX_HASH, dtype=np.uint64)
+        values = np.fromiter(shingle_set, dtype=np.uint64, count=len(shingle_set))
+        hashed = (np.outer(values, self.a) + self.b) % MERSENNE_PRIME & MAX_HASH
+        return hashed.min(axis=0)
+
+
+def lsh_candidate_pairs(signatures: List[np.ndarray], bands: int) -> set:
+    """
+    Agrupa las firmas por bandas (LSH) y retorna los pares de índices que
+    coinciden en al menos una banda.
+    """
+    if not signatures:
+        return set()
+    rows = len(signatures[0]) // bands
+    candidates = set()
+    for band in range(bands):
+        buckets: Dict[bytes, List[int]] = {}
+        for idx, sig in enumerate(signatures):
+            key = sig[band * rows:(band + 1) * rows].tobytes()
+            buckets.setdefault(key, []).append(idx)
+        for members in buckets.values():
+            for i in range(len(members)):
+                for j in range(i + 1, len(members)):
+                    candidates.add((members[i], members[j]))
+    return candidates
+
+
+def _find(parent: List[int], i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def _union(parent: List[int], i: int, j: int) -> None:
+    ri, rj = _find(parent, i), _find(parent, j)
+    if ri == rj:
+        return
+    # El representante es siempre el chunk que aparece primero
+    if ri < rj:
+        parent[rj] = ri
+    else:
+        parent[ri] = rj
+
+
+def deduplicate_chunks(
+    chunks: list,
+    threshold: float = 0.85,
+    num_perm: int = 128,
+    bands: int = 16,
+    shingle_size: int = 5
+) -> Tuple[list, Dict]:
+    """
+    Colapsa chunks duplicados y casi duplicados dentro de cada paquete.
+    Primero agrupa por hash exacto del texto normalizado y después detecta
+    casi duplicados con MinHash/LSH, confirmando cada par candidato con la
+    similitud de Jaccard estimada. Cada grupo se reduce a un chunk canónico
+    (el primero en orden de aparición) con la lista 'sources' de todas sus
+    ubicaciones de origen. Retorna los chunks canónicos y las estadísticas.
+    """
+    parent = list(range(len(chunks)))
+
+    seen: Dict[Tuple[str, str], int] = {}
+    for idx, chunk in enumerate(chunks):
+        key = (chunk["package"], exact_hash(chunk["text"]))
+        if key in seen:
+            _union(parent, seen[key], idx)
+        else:
+            seen[key] = idx
+    exact_duplicates = len(chunks) - len(seen)
+
+    hasher = MinHasher(num_perm=num_perm)
+    by_package: Dict[str, List[int]] = {}
+    for idx in seen.values():
+        by_package.setdefault(chunks[idx]["package"], []).append(idx)
+
+    near_duplicates = 0
+    for package, indices in by_package.items():
+        signatures = [hasher.signature(shingles(chunks[i]["text"], shingle_size)) for i in indices]
+        for i, j in sorted(lsh_candidate_pairs(signatures, bands)):
+            similarity = float(np.mean(signatures[i] == signatures[j]))
+            if similarity >= threshold and _find(parent, indices[i]) != _find(parent, indices[j]):
+                _union(parent, indices[i], indices[j])
+                near_duplicates += 1
+
+    groups: Dict[int, List[int]] = {}
+    for idx in range(len(chunks)):
+        groups.setdefault(_find(parent, idx), []).append(idx)
+
+    unique_chunks = []
+    for root in sorted(groups):
+        canonical = dict(chunks[root])
+        canonical["sources"] = [
+            {"file": chunks[i]["file"], "chunk_id": chunks[i]["chunk_id"], "folder": chunks[i]["folder"]}
+            for i in groups[root]
+        ]
+        unique_chunks.append(canonical)
+
+    total = len(chunks)
+    stats = {
+        "total_chunks": total,
+        "unique_chunks": len(unique_chunks),
+        "exact_duplicates": exact_duplicates,
+        "near_duplicates": near_duplicates,
+        "dedup_ratio": (1 - len(unique_chunks) / total) if total else 0.0
+    }
+    logger.info(
+        "Deduplicación: %d chunks -> %d únicos (%d exactos, %d casi duplicados, ratio %.2f%%).",
+        total, len(unique_chunks), exact_duplicates, near_duplicates, stats["dedup_ratio"] * 100
+    )
+    return unique_chunks, stats
+
+
+def build_next_edges(chunks: list) -> List[Dict]:
+    """
+    Reconstruye las relaciones NEXT entre chunks canónicos a partir de las
+    ubicaciones de origen, de modo que la secuencia de cada archivo se conserva
+    aunque alguno de sus chunks haya sido colapsado en otro archivo. Cada relación
+    lleva en 'file' el archivo cuya secuencia representa: un chunk compartido por
+    varios archivos tiene un NEXT por archivo, y la expansión de vecinos debe seguir
+    solo las relaciones del archivo de la semilla para no saltar entre documentos.
+    """
+    location_to_canonical: Dict[Tuple[str, int], Tuple[str, int]] = {}
+    for chunk in chunks:
+        key = (chunk["file"], chunk["chunk_id"])
+        for source in chunk.get("sources", [{"file": chunk["file"], "chunk_id": chunk["chunk_id"]}]):
+            location_to_canonical[(source["file"], source["chunk_id"])] = key
+
+    edges = set()
+    for (file, chunk_id), start in location_to_canonical.items():
+        end = location_to_canonical.get((file, chunk_id + 1))
+        if end is not None and end != start:
+            edges.add((start, end, file))
+
+    return [
+        {"from_file": a[0], "from_chunk_id": a[1], "to_file": b[0], "to_chunk_id": b[1], "file": file}
+        for a, b, file in sorted(edges)
+    ]
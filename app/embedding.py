@@ -0,0 +1,33 @@
+import os
+import logging
+from dotenv import load_dotenv
+from openai import OpenAI, DefaultHttpxClient
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+os.environ["SSL_CERT_FILE"] = ""
+
+load_dotenv()
+OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+
+if not OPENAI_API_KEY:
+    raise ValueError("Asegúrate de definir OPENAI_API_KEY en el archivo .env")
+
+# Solo necesita OpenAI: no abre conexiones a Neo4j ni cambia el directorio de trabajo
+openai_client = OpenAI(
+    api_key=OPENAI_API_KEY,
+    http_client=DefaultHttpxClient()
+)
+logger.info("Cliente de OpenAI instanciado correctamente.")
+
+def get_embedding_for_text(text: str, model: str = "text-embedding-ada-002") -> list:
+    text_cleaned = text.replace("\n", " ")
+    try:
+        response = openai_client.embeddings.create(model=model, input=text_cleaned)
+        embedding = response.data[0].embedding
+        return embedding
+    except Exception as e:
+        logger.error("Error al generar embedding para el texto: %s", e)
+        raise
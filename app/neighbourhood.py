@@ -0,0 +1,40 @@
+from typing import Dict, Iterable, Tuple
+
+from text_utils import estimate_tokens
+
+
+def arrange_neighbourhood(seeds: list, neighbours: Iterable[Tuple], max_chunks: int, max_tokens: int) -> list:
+    """
+    Combina los chunks semilla con sus vecinos NEXT y prepara el contexto del prompt.
+
+    'seeds' son tuplas (score, chunk, key) ordenadas por relevancia; 'neighbours'
+    son tuplas (seed_rank, offset, score, chunk, key), donde 'offset' es la posición
+    relativa a la semilla (negativa para predecesores). Un chunk alcanzado desde
+    varias semillas se asigna a la de mayor puntuación.
+
+    La selección respeta 'max_chunks' y 'max_tokens': primero las semillas por
+    relevancia y después los vecinos por puntuación decreciente. El resultado se
+    ordena por semilla y, dentro de cada una, en orden de documento, para que cada
+    fragmento aparezca junto a los chunks que lo continúan.
+    """
+    best: Dict = {key: (score, rank, 0, chunk) for rank, (score, chunk, key) in enumerate(seeds)}
+    seed_keys = set(best)
+    for rank, offset, score, chunk, key in neighbours:
+        if key in seed_keys:
+            continue
+        if key not in best or best[key][0] < score:
+            best[key] = (score, rank, offset, chunk)
+
+    candidates = sorted(best.items(), key=lambda item: (item[0] not in seed_keys, -item[1][0], item[1][1]))
+    selected, tokens = [], 0
+    for key, (score, rank, offset, chunk) in candidates:
+        if len(selected) >= max_chunks:
+            break
+        chunk_tokens = estimate_tokens(chunk.get("text", ""))
+        if selected and tokens + chunk_tokens > max_tokens:
+            continue
+        selected.append((rank, offset, score, chunk, key))
+        tokens += chunk_tokens
+
+    selected.sort(key=lambda item: (item[0], item[1]))
+    return [(score, chunk, key) for _, _, score, chunk, key in selected]
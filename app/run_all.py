@@ -34,8 +34,10 @@ else:
 
 try:
     import chunking
+    import dedup
     chunks_data = chunking.process_all_files(base_directory)
     logger.info("Total de chunks generados: %d", len(chunks_data))
+    chunks_data, dedup_stats = dedup.deduplicate_chunks(chunks_data)
 except Exception as e:
     logger.error("Error al procesar archivos (chunking): %s", e)
     exit(1)
@@ -51,7 +53,7 @@ try:
             logger.info("No se encontraron nodos en la base de datos. Iniciando almacenamiento de embeddings...")
             import store_embedding
             store_embedding.store_chunks_in_neo4j(chunks_data)
-            store_embedding.create_relationships()
+            store_embedding.create_relationships(dedup.build_next_edges(chunks_data))
             logger.info("Embeddings y relaciones almacenados en Neo4j.")
 except Exception as e:
     logger.error("Error en el almacenamiento de embeddings en Neo4j: %s", e)
@@ -5,15 +5,14 @@ from dotenv import load_dotenv
 from fastapi import HTTPException  
 from neo4j import GraphDatabase
 import numpy as np
-from openai import OpenAI, DefaultHttpxClient
 from chunking import process_all_files
+from dedup import deduplicate_chunks, build_next_edges
+from embedding import get_embedding_for_text
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
-os.environ["SSL_CERT_FILE"] = ""
-
 load_dotenv()
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 NEO4J_PASSWORD = os.environ.get("NEO4J_PASSWORD")
@@ -25,29 +24,15 @@ script_directory = os.path.abspath(os.path.dirname(__file__))
 os.chdir(script_directory)
 logger.info("Directorio de trabajo establecido en: %s", os.getcwd())
 
-openai_client = OpenAI(
-    api_key=OPENAI_API_KEY,
-    http_client=DefaultHttpxClient()
-)
-logger.info("Cliente de OpenAI instanciado correctamente.")
-
 neo4j_user = "neo4j"
 neo4j_uri = os.environ.get("NEO4J_URI", "bolt://localhost:7687")
 logger.info("NEO4J_URI: %s", neo4j_uri)
 driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, NEO4J_PASSWORD))
 logger.info("Conexión a Neo4j establecida.")
 
-def get_embedding_for_text(text: str, model: str = "text-embedding-ada-002") -> list:
-    text_cleaned = text.replace("\n", " ")
-    try:
-        response = openai_client.embeddings.create(model=model, input=text_cleaned)
-        embedding = response.data[0].embedding
-        return embedding
-    except Exception as e:
-        logger.error("Error al generar embedding para el texto: %s", e)
-        raise
-
-def create_chunk_node(tx, file: str, chunk_id: int, text: str, embedding: list, package: str):
+def create_chunk_node(tx, file: str, chunk_id: int, text: str, embedding: list, package: str,
+                      sources: list = None):
+    sources = sources or [{"file": file, "chunk_id": chunk_id}]
     query = """
     CREATE (c:Chunk {
         file: $file,
@@ -55,11 +40,15 @@ def create_chunk_node(tx, file: str, chunk_id: int, text: str, embedding: list,
         text: $text,
         embedding: $embedding,
         folder: $folder,
-        package: $package
+        package: $package,
+        source_files: $source_files,
+        source_chunk_ids: $source_chunk_ids
     })
     """
     tx.run(query, file=file, chunk_id=chunk_id, text=text, embedding=embedding, 
-           folder=os.path.dirname(file), package=package)
+           folder=os.path.dirname(file), package=package,
+           source_files=[s["file"] for s in sources],
+           source_chunk_ids=[s["chunk_id"] for s in sources])
 
 def store_chunks_in_neo4j(chunks: list):
     with driver.session() as session:
@@ -73,20 +62,39 @@ def store_chunks_in_neo4j(chunks: list):
                     chunk["chunk_id"],
                     chunk["text"],
                     embedding,
-                    chunk["package"]  
+                    chunk["package"],
+                    chunk.get("sources")
                 )
             except Exception as e:
                 logger.error("Error procesando el chunk %s de %s: %s", chunk["chunk_id"], chunk["file"], e)
     logger.info("Todos los chunks han sido almacenados en Neo4j.")
 
-def create_relationships():
-    query = """
-    MATCH (a:Chunk), (b:Chunk)
-    WHERE a.file = b.file AND a.chunk_id + 1 = b.chunk_id
-    MERGE (a)-[:NEXT]->(b)
+def create_relationships(edges: list = None):
     """
-    with driver.session() as session:
-        session.run(query)
+    Crea las relaciones NEXT. Si se reciben 'edges' (ver dedup.build_next_edges)
+    se crean en lote a partir de ellas; si no, se enlazan los chunks consecutivos
+    del mismo archivo.
+    """
+    if edges is None:
+        query = """
+        MATCH (a:Chunk), (b:Chunk)
+        WHERE a.file = b.file AND a.chunk_id + 1 = b.chunk_id
+        MERGE (a)-[:NEXT]->(b)
+        """
+        with driver.session() as session:
+            session.run(query)
+    else:
+        query = """
+        UNWIND $edges AS edge
+        MATCH (a:Chunk {file: edge.from_file, chunk_id: edge.from_chunk_id})
+        MATCH (b:Chunk {file: edge.to_file, chunk_id: edge.to_chunk_id})
+        MERGE (a)-[:NEXT {file: edge.file}]->(b)
+        """
+        with driver.session() as session:
+            # Sin índice cada MATCH por (file, chunk_id) recorre todos los nodos Chunk
+            session.run("CREATE INDEX chunk_file_chunk_id IF NOT EXISTS FOR (c:Chunk) ON (c.file, c.chunk_id)")
+            session.run("CALL db.awaitIndexes()")
+            session.run(query, edges=edges)
     logger.info("Relaciones NEXT creadas entre chunks del mismo archivo.")
 
 if __name__ == "__main__":
@@ -95,12 +103,15 @@ if __name__ == "__main__":
         base_directory = os.getcwd()  
         chunks_data = process_all_files(base_directory)
         logger.info("Total de chunks generados: %d", len(chunks_data))
+
+        logger.info("Deduplicando chunks...")
+        unique_chunks, dedup_stats = deduplicate_chunks(chunks_data)
         
         logger.info("Almacenando chunks en Neo4j...")
-        store_chunks_in_neo4j(chunks_data)
+        store_chunks_in_neo4j(unique_chunks)
         
         logger.info("Creando relaciones NEXT entre chunks...")
-        create_relationships()
+        create_relationships(build_next_edges(unique_chunks))
         
     except Exception as ex:
         logger.error("Error en el proceso de almacenamiento de embeddings: %s", ex)
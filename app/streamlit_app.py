@@ -1,5 +1,7 @@
+import uuid
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 
 st.set_page_config(page_title="Chat RAG de Grafos", layout="wide")
 
@@ -54,10 +56,23 @@ main.block-container {
 
 API_URL = "http://host.docker.internal:8000/chat"
 
+def obtener_sesion_http() -> requests.Session:
+    # Una sesión HTTP por usuario, conservada entre reruns para reutilizar las
+    # conexiones con la API sin compartir cookies ni estado entre usuarios
+    if "http_session" not in st.session_state:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        st.session_state.http_session = session
+    return st.session_state.http_session
+
 if "messages" not in st.session_state:
     st.session_state.messages = [
         {"role": "assistant", "content": "Hola, soy tu asistente. ¿En qué puedo ayudarte hoy?"}
     ]
+if "session_id" not in st.session_state:
+    st.session_state.session_id = str(uuid.uuid4())
 if "selected_package" not in st.session_state:
     st.session_state.selected_package = "faucet"
 
@@ -65,10 +80,11 @@ def obtener_respuesta_desde_api(user_input: str, package: str):
     params = {
         "q": user_input,
         "package": package,
-        "limit": 5
+        "limit": 5,
+        "session_id": st.session_state.session_id
     }
     try:
-        response = requests.post(API_URL, params=params)
+        response = obtener_sesion_http().post(API_URL, params=params)
         if response.status_code == 200:
             data = response.json()
             return data.get("answer", "No se pudo obtener respuesta.")
@@ -78,6 +94,11 @@ def obtener_respuesta_desde_api(user_input: str, package: str):
         return f"Error al conectar con la API: {e}"
 
 def borrar_historial():
+    try:
+        obtener_sesion_http().delete(f"{API_URL}/sessions/{st.session_state.session_id}")
+    except Exception:
+        pass
+    st.session_state.session_id = str(uuid.uuid4())
     st.session_state.messages = [
         {"role": "assistant", "content": "Historial borrado. ¿En qué puedo ayudarte hoy?"}
     ]
@@ -0,0 +1,98 @@
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected, cap_queue_to_thread_pool
+
+
+def wait_for_queue(controller, depth, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while controller.metrics()["queue_depth"] < depth:
+        assert time.monotonic() < deadline, "la cola no alcanzó la profundidad esperada"
+        time.sleep(0.005)
+
+
+def test_admits_up_to_max_concurrency_without_waiting():
+    controller = AdmissionController(max_concurrency=2, max_queue=1, timeout=0.1)
+    assert controller.acquire() == pytest.approx(0, abs=0.05)
+    controller.acquire()
+    assert controller.metrics()["active"] == 2
+    controller.release()
+    controller.release()
+    assert controller.metrics()["active"] == 0
+
+
+def test_full_queue_is_rejected_with_429_and_retry_after():
+    controller = AdmissionController(max_concurrency=1, max_queue=0, timeout=0.1)
+    controller.acquire()
+    with pytest.raises(AdmissionRejected) as excinfo:
+        controller.acquire()
+    assert excinfo.value.status_code == 429
+    assert excinfo.value.retry_after >= 1
+    assert controller.metrics()["rejected_queue_full"] == 1
+
+
+def test_retry_after_scales_with_service_time_and_queue():
+    controller = AdmissionController(max_concurrency=1, max_queue=0, timeout=0.1)
+    controller.acquire()
+    controller.release(service_time=4.0)
+    controller.acquire()
+    with pytest.raises(AdmissionRejected) as excinfo:
+        controller.acquire()
+    assert excinfo.value.retry_after == 4
+
+
+def test_wait_deadline_is_rejected_with_503_and_leaves_queue_clean():
+    controller = AdmissionController(max_concurrency=1, max_queue=2, timeout=0.05)
+    controller.acquire()
+    with pytest.raises(AdmissionRejected) as excinfo:
+        controller.acquire()
+    assert excinfo.value.status_code == 503
+    metrics = controller.metrics()
+    assert metrics["queue_depth"] == 0
+    assert metrics["rejected_timeout"] == 1
+    # El hueco sigue siendo del primer titular y se libera con normalidad
+    controller.release()
+    assert controller.metrics()["active"] == 0
+
+
+def test_release_hands_slot_to_highest_priority_waiter():
+    controller = AdmissionController(max_concurrency=1, max_queue=4, timeout=2.0)
+    controller.acquire()
+    order = []
+
+    def worker(name, priority):
+        controller.acquire(priority=priority)
+        order.append(name)
+        controller.release()
+
+    low = threading.Thread(target=worker, args=("baja", 9))
+    low.start()
+    wait_for_queue(controller, 1)
+    high = threading.Thread(target=worker, args=("alta", 0))
+    high.start()
+    wait_for_queue(controller, 2)
+
+    controller.release()
+    low.join()
+    high.join()
+    assert order == ["alta", "baja"]
+    metrics = controller.metrics()
+    assert metrics["active"] == 0
+    assert metrics["admitted"] == 3
+
+
+def test_slot_releases_on_exception():
+    controller = AdmissionController(max_concurrency=1, max_queue=0)
+    with pytest.raises(ValueError):
+        with controller.slot():
+            raise ValueError("fallo")
+    assert controller.metrics()["active"] == 0
+
+
+def test_queue_is_capped_to_thread_pool():
+    assert cap_queue_to_thread_pool(4, 16, thread_limit=40, reserve=8) == 16
+    assert cap_queue_to_thread_pool(4, 100, thread_limit=40, reserve=8) == 28
+    with pytest.raises(ValueError):
+        cap_queue_to_thread_pool(50, 0, thread_limit=40, reserve=8)
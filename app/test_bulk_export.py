@@ -0,0 +1,64 @@
+import csv
+import os
+
+import numpy as np
+
+from bulk_export import export_artifact, load_artifact, write_neo4j_import_csvs
+from dedup import build_next_edges
+
+
+def make_chunks():
+    return [
+        {
+            "package": "faucet", "file": "docs/a.md", "folder": "docs", "chunk_id": i,
+            "text": f"chunk {i}, con \"comillas\"\ny salto de línea",
+            "sources": [{"file": "docs/a.md", "chunk_id": i, "folder": "docs"}]
+        }
+        for i in range(3)
+    ]
+
+
+def test_artifact_round_trip(tmp_path):
+    chunks = make_chunks()
+    embeddings = [[1.0, 0.0], [0.5, 0.5], [0.0, 1.0]]
+    path = export_artifact(chunks, embeddings, build_next_edges(chunks), str(tmp_path / "corpus"))
+    assert path.endswith(".npz")
+
+    artifact = load_artifact(path)
+    assert artifact["chunks"][1]["text"] == chunks[1]["text"]
+    assert artifact["chunks"][1]["chunk_id"] == 1
+    assert artifact["chunks"][1]["sources"] == chunks[1]["sources"]
+    assert artifact["embeddings"].dtype == np.float32
+    assert np.allclose(artifact["embeddings"], embeddings)
+    assert artifact["edges"].tolist() == [[0, 1], [1, 2]]
+
+
+def test_long_row_does_not_pad_string_columns(tmp_path):
+    chunks = make_chunks()
+    chunks[0]["text"] = "ñ" * 200_000
+    path = export_artifact(chunks, [[1.0, 0.0]] * 3, [], str(tmp_path / "corpus.npz"))
+
+    with np.load(path, allow_pickle=False) as data:
+        assert all(data[name].dtype.kind in "uif" for name in data.files)
+        assert data["text_data"].nbytes < 200_000 * 2 + 1000
+    artifact = load_artifact(path)
+    assert [chunk["text"] for chunk in artifact["chunks"]] == [chunk["text"] for chunk in chunks]
+    assert artifact["edges"].shape == (0, 2)
+    assert artifact["edge_files"] == []
+
+
+def test_neo4j_import_csvs(tmp_path):
+    chunks = make_chunks()
+    path = export_artifact(chunks, [[1.0, 0.0]] * 3, build_next_edges(chunks), str(tmp_path / "corpus.npz"))
+    nodes_path, edges_path = write_neo4j_import_csvs(load_artifact(path), str(tmp_path / "import"))
+
+    with open(nodes_path, encoding="utf-8", newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0][0] == ":ID"
+    assert len(rows) == 4
+    assert rows[1][3] == chunks[0]["text"]
+    assert rows[1][4] == "1.0;0.0"
+
+    with open(edges_path, encoding="utf-8", newline="") as f:
+        assert list(csv.reader(f))[1:] == [["0", "1", "docs/a.md", "NEXT"], ["1", "2", "docs/a.md", "NEXT"]]
+    assert os.path.dirname(nodes_path) == os.path.dirname(edges_path)
@@ -0,0 +1,118 @@
+import threading
+
+from conversation import ConversationStore
+from text_utils import estimate_tokens
+
+
+def test_window_is_bounded_and_evicted_turns_go_to_summary():
+    store = ConversationStore(max_turns=2, summary_tokens=50)
+    conversation = store.get("s", "faucet")
+    for i in range(4):
+        evicted = store.record_turn(conversation, f"pregunta {i}", f"respuesta {i}")
+        if evicted:
+            store.compact(conversation, evicted)
+    assert [turn["question"] for turn in conversation.turns] == ["pregunta 2", "pregunta 3"]
+    assert "pregunta 1" in conversation.summary
+    assert conversation.pending == []
+    assert estimate_tokens(conversation.summary) <= 50
+
+
+def test_eviction_is_batched_and_pending_turns_stay_in_history():
+    calls = []
+
+    def summarizer(summary, turns, max_tokens):
+        calls.append([turn["question"] for turn in turns])
+        return "resumen"
+
+    store = ConversationStore(max_turns=4, summarizer=summarizer)
+    conversation = store.get("s", "faucet")
+    batches = [store.record_turn(conversation, f"p{i}", f"r{i}") for i in range(8)]
+    evicted = [batch for batch in batches if batch]
+    assert [[turn["question"] for turn in batch] for batch in evicted] == [["p0", "p1", "p2"], ["p3", "p4", "p5"]]
+    assert calls == []
+
+    contents = [message["content"] for message in conversation.history_messages()]
+    assert contents[0] == "p0" and len(contents) == 16
+
+    for batch in evicted:
+        store.compact(conversation, batch)
+    assert len(calls) == 2
+    assert conversation.pending == []
+    assert conversation.history_messages()[0]["content"] == "Resumen de la conversación previa: resumen"
+
+
+def test_embeddings_are_reused_from_cache():
+    store = ConversationStore(max_turns=4)
+    conversation = store.get("s", "faucet")
+    calls = []
+
+    def embed(text):
+        calls.append(text)
+        return [1.0, 0.0]
+
+    conversation.condensed_embedding("a", embed)
+    store.record_turn(conversation, "a", "r")
+    combined = conversation.condensed_embedding("a", embed)
+    assert calls == ["a"]
+    assert combined == [1.5, 0.0]
+
+
+def test_summarizer_runs_outside_the_conversation_lock():
+    held = []
+
+    def summarizer(summary, turns, max_tokens):
+        held.append(conversation.lock.locked())
+        return "resumen"
+
+    store = ConversationStore(max_turns=1, summarizer=summarizer)
+    conversation = store.get("s", "faucet")
+    store.record_turn(conversation, "p1", "r1")
+    store.compact(conversation, store.record_turn(conversation, "p2", "r2"))
+    assert held == [False]
+    assert conversation.summary == "resumen"
+
+
+def test_failed_summarizer_falls_back_to_extractive_summary():
+    def summarizer(summary, turns, max_tokens):
+        raise RuntimeError("cola llena")
+
+    store = ConversationStore(max_turns=1, summarizer=summarizer)
+    conversation = store.get("s", "faucet")
+    store.record_turn(conversation, "p1", "r1")
+    store.compact(conversation, store.record_turn(conversation, "p2", "r2"))
+    assert conversation.summary == "Usuario: p1 Asistente: r1"
+
+
+def test_package_change_starts_new_conversation():
+    store = ConversationStore()
+    conversation = store.get("s", "faucet")
+    store.record_turn(conversation, "p", "r")
+    assert store.get("s", "taplock") is not conversation
+    assert store.delete("s")
+    assert not store.delete("s")
+
+
+def test_concurrent_reads_and_writes_on_same_session():
+    store = ConversationStore(max_turns=2)
+    conversation = store.get("s", "faucet")
+    errors = []
+
+    def writer():
+        for i in range(500):
+            store.compact(conversation, store.record_turn(conversation, f"p{i}", "r"))
+
+    def reader():
+        try:
+            for _ in range(500):
+                conversation.condensed_question("q")
+                conversation.condensed_embedding("q", lambda text: [1.0])
+                conversation.history_messages()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer), threading.Thread(target=reader)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
@@ -0,0 +1,93 @@
+import random
+
+import pytest
+
+from dedup import build_next_edges, deduplicate_chunks
+
+
+def make_chunk(file, chunk_id, text, package="faucet"):
+    return {"package": package, "file": file, "folder": "docs", "chunk_id": chunk_id, "text": text}
+
+
+def random_text(rng, n_words=150):
+    return " ".join(f"w{rng.randrange(500)}" for _ in range(n_words))
+
+
+def test_exact_duplicates_ignore_whitespace():
+    text = "library(faucet)\n\nfaucet::start()"
+    chunks = [make_chunk("en/a.md", 0, text), make_chunk("es/a.md", 0, "  " + text.replace("\n", " "))]
+    unique, stats = deduplicate_chunks(chunks)
+    assert len(unique) == 1
+    assert stats["exact_duplicates"] == 1
+    assert [s["file"] for s in unique[0]["sources"]] == ["en/a.md", "es/a.md"]
+
+
+def test_near_duplicates_collapse_and_distinct_chunks_survive():
+    rng = random.Random(0)
+    base = random_text(rng)
+    words = base.split()
+    words[70] = "cambiado"
+    chunks = [
+        make_chunk("a.md", 0, base),
+        make_chunk("a.md", 1, random_text(rng)),
+        make_chunk("b.md", 0, " ".join(words))
+    ]
+    unique, stats = deduplicate_chunks(chunks)
+    assert len(unique) == 2
+    assert stats["near_duplicates"] == 1
+    assert stats["dedup_ratio"] == pytest.approx(1 / 3)
+    # El canónico es siempre el primero en orden de aparición
+    assert (unique[0]["file"], unique[0]["chunk_id"]) == ("a.md", 0)
+
+
+def test_duplicates_are_not_collapsed_across_packages():
+    chunks = [make_chunk("a.md", 0, "mismo texto", "faucet"), make_chunk("b.md", 0, "mismo texto", "taplock")]
+    unique, stats = deduplicate_chunks(chunks)
+    assert len(unique) == 2
+    assert stats["dedup_ratio"] == 0
+
+
+def test_union_find_merges_transitive_groups():
+    chunks = [make_chunk(f"f{i}.md", 0, "texto repetido") for i in range(4)]
+    unique, _ = deduplicate_chunks(chunks)
+    assert len(unique) == 1
+    assert len(unique[0]["sources"]) == 4
+
+
+def test_empty_input():
+    unique, stats = deduplicate_chunks([])
+    assert unique == []
+    assert stats["dedup_ratio"] == 0.0
+
+
+def test_next_edges_are_labelled_with_their_file():
+    # en/a.md y es/a.md comparten el bloque de código en la posición 1
+    chunks = [
+        make_chunk("en/a.md", 0, "introduction"),
+        make_chunk("en/a.md", 1, "bloque compartido"),
+        make_chunk("en/a.md", 2, "continuation in english"),
+        make_chunk("es/a.md", 0, "introducción"),
+        make_chunk("es/a.md", 1, "bloque compartido"),
+        make_chunk("es/a.md", 2, "continuación en español")
+    ]
+    unique, _ = deduplicate_chunks(chunks)
+    edges = {
+        (e["file"], e["from_file"], e["from_chunk_id"], e["to_file"], e["to_chunk_id"])
+        for e in build_next_edges(unique)
+    }
+    # El bloque compartido (canónico en/a.md#1) tiene un NEXT por archivo; seguir
+    # solo las relaciones del mismo archivo nunca pasa de un idioma a otro
+    assert edges == {
+        ("en/a.md", "en/a.md", 0, "en/a.md", 1),
+        ("en/a.md", "en/a.md", 1, "en/a.md", 2),
+        ("es/a.md", "es/a.md", 0, "en/a.md", 1),
+        ("es/a.md", "en/a.md", 1, "es/a.md", 2)
+    }
+    english = [e for e in edges if e[0] == "en/a.md"]
+    assert all("es/a.md" not in (e[1], e[3]) for e in english)
+
+
+def test_next_edges_skip_self_loops():
+    chunks = [make_chunk("a.md", 0, "repetido"), make_chunk("a.md", 1, "repetido")]
+    unique, _ = deduplicate_chunks(chunks)
+    assert build_next_edges(unique) == []
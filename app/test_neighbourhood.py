@@ -0,0 +1,79 @@
+import numpy as np
+
+from bulk_export import ChunkIndex
+from neighbourhood import arrange_neighbourhood
+
+
+def chunk(name, words=10):
+    return {"text": " ".join([name] * words), "name": name}
+
+
+def test_runs_are_kept_in_document_order_per_seed():
+    seeds = [(0.9, chunk("s0"), "s0"), (0.8, chunk("s1"), "s1")]
+    neighbours = [
+        (0, 1, 0.72, chunk("s0+1"), "s0+1"),
+        (0, -1, 0.72, chunk("s0-1"), "s0-1"),
+        (1, 1, 0.64, chunk("s1+1"), "s1+1")
+    ]
+    result = arrange_neighbourhood(seeds, neighbours, max_chunks=10, max_tokens=10000)
+    assert [key for _, _, key in result] == ["s0-1", "s0", "s0+1", "s1", "s1+1"]
+
+
+def test_cap_keeps_seeds_before_neighbours():
+    seeds = [(0.9, chunk("s0"), "s0"), (0.6, chunk("s1"), "s1")]
+    neighbours = [(0, 1, 0.8, chunk("s0+1"), "s0+1"), (0, 2, 0.7, chunk("s0+2"), "s0+2")]
+    result = arrange_neighbourhood(seeds, neighbours, max_chunks=3, max_tokens=10000)
+    assert [key for _, _, key in result] == ["s0", "s0+1", "s1"]
+
+
+def test_token_budget_limits_context():
+    seeds = [(0.9, chunk("s0", 40), "s0")]
+    neighbours = [(0, i, 0.9 - i / 10, chunk(f"n{i}", 40), f"n{i}") for i in range(1, 6)]
+    result = arrange_neighbourhood(seeds, neighbours, max_chunks=100, max_tokens=100)
+    assert len(result) == 3
+    assert result[0][2] == "s0"
+
+
+def test_neighbour_shared_by_two_seeds_is_included_once():
+    seeds = [(0.9, chunk("s0"), "s0"), (0.8, chunk("s1"), "s1")]
+    neighbours = [(0, 1, 0.45, chunk("n"), "n"), (1, -1, 0.64, chunk("n"), "n")]
+    result = arrange_neighbourhood(seeds, neighbours, max_chunks=10, max_tokens=10000)
+    assert [key for _, _, key in result] == ["s0", "n", "s1"]
+
+
+def test_chunk_index_expand_terminates_on_cycles():
+    chunks = [
+        {"package": "faucet", "file": "a.md", "folder": "", "chunk_id": i, "text": f"t{i}", "sources": []}
+        for i in range(3)
+    ]
+    artifact = {
+        "chunks": chunks,
+        "embeddings": np.eye(3, dtype=np.float32),
+        "edges": np.array([[0, 1], [1, 2], [2, 0]], dtype=np.int32),
+        "edge_files": ["a.md", "a.md", "a.md"]
+    }
+    index = ChunkIndex(artifact)
+    seeds = index.search([1, 0, 0], "faucet", 1)
+    result = index.expand(seeds, hops=5, decay=0.5, max_chunks=10, max_tokens=10000)
+    assert sorted(row for _, _, row in result) == [0, 1, 2]
+
+
+def test_chunk_index_expand_follows_only_the_seed_file():
+    # Fila 1 es el bloque compartido por en/a.md y es/a.md (canónico en en/a.md)
+    files = ["en/a.md", "en/a.md", "en/a.md", "es/a.md", "es/a.md"]
+    chunks = [
+        {"package": "faucet", "file": f, "folder": "", "chunk_id": i, "text": f"t{i}", "sources": []}
+        for i, f in enumerate(files)
+    ]
+    artifact = {
+        "chunks": chunks,
+        "embeddings": np.eye(5, dtype=np.float32),
+        "edges": np.array([[0, 1], [1, 2], [3, 1], [1, 4]], dtype=np.int32),
+        "edge_files": ["en/a.md", "en/a.md", "es/a.md", "es/a.md"]
+    }
+    index = ChunkIndex(artifact)
+    english = index.expand(index.search([0, 1, 0, 0, 0], "faucet", 1), 2, 0.5, 10, 10000)
+    assert [row for _, _, row in english] == [0, 1, 2]
+    spanish = index.expand(index.search([0, 0, 0, 1, 0], "faucet", 1), 2, 0.5, 10, 10000)
+    # El bloque compartido sí es la continuación de es/a.md#0, seguido de es/a.md#2
+    assert [row for _, _, row in spanish] == [3, 1, 4]
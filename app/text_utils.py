@@ -0,0 +1,16 @@
+def estimate_tokens(text: str) -> int:
+    """
+    Estimación aproximada del número de tokens (unos 4 caracteres por token).
+    """
+    return len(text) // 4 + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Recorta el texto por el principio hasta que quepa en 'max_tokens',
+    conservando la información más reciente.
+    """
+    words = text.split()
+    while words and estimate_tokens(" ".join(words)) > max_tokens:
+        words = words[len(words) // 10 + 1:]
+    return " ".join(words)